@@ -0,0 +1,527 @@
+"""Teste de carga com sessões simultâneas do app.py.
+
+Simula N operadores usando o Streamlit AppTest (login, envio do formulário
+e interações com os filtros da página de Gráficos) contra um substituto
+local do Supabase, e reporta a latência das execuções (p50/p95), a memória
+(RSS) por sessão e a quantidade de chamadas ao backend.
+
+No modo "servidor" (padrão) as sessões são intercaladas em um único processo,
+compartilhando interpretador e cache como em um servidor real; cada rodada de
+execuções é atendida em fila. No modo "isolado" cada sessão roda em um processo
+próprio, com cache próprio, e o substituto do Supabase fica em um processo
+gerenciador compartilhado; os números desse modo valem para uma sessão isolada.
+
+Uso:
+    python carga.py --sessoes 20 --interacoes 5 --registros 2000
+"""
+import argparse
+import copy
+import datetime
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from multiprocessing.managers import BaseManager
+
+import supabase
+from streamlit.testing.v1 import AppTest
+
+import registro
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Limite de linhas por resposta, como na API do Supabase
+LIMITE_LINHAS = 1000
+
+
+# Restrições de unicidade da tabela microbiologia (ver README)
+RESTRICOES_UNICAS = {
+    "microbiologia": {
+        "microbiologia_idrequisicao_key": ["idrequisicao"],
+        "microbiologia_chave_natural": ["dataamostra", "pontoamostra"],
+    }
+}
+
+
+# Erro no mesmo formato do Supabase (atributos message e code)
+class ErroLocal(Exception):
+    def __init__(self, message, code):
+        super().__init__(message, code)
+        self.message = message
+        self.code = code
+
+    def __str__(self):
+        return f"{self.code}: {self.message}"
+
+
+# Função para verificar as restrições de unicidade antes de gravar uma linha
+def verificar_unicidade(tabela, linhas, nova, ignorar=None):
+    for nome, colunas in RESTRICOES_UNICAS.get(tabela, {}).items():
+        chave = tuple(nova.get(coluna) for coluna in colunas)
+        if None in chave:
+            continue
+        for atual in linhas:
+            if atual is not ignorar and tuple(atual.get(coluna) for coluna in colunas) == chave:
+                raise ErroLocal(f'duplicate key value violates unique constraint "{nome}"', "23505")
+
+
+# Função para avaliar um filtro (coluna, operador, valor, negação) sobre uma linha
+def atende_filtro(linha, filtro):
+    coluna, operador, valor, negar = filtro
+    atual = linha.get(coluna)
+    if operador == "in":
+        resultado = atual in valor
+    elif operador == "gte":
+        resultado = atual is not None and atual >= valor
+    else:
+        resultado = atual is not None and atual <= valor
+    return resultado != negar
+
+
+# Resposta no mesmo formato do cliente Supabase (atributo data)
+class RespostaLocal:
+    def __init__(self, data):
+        self.data = data
+
+
+# Consulta encadeável que imita o construtor de consultas do Supabase
+class ConsultaLocal:
+    def __init__(self, backend, tabela):
+        self.backend = backend
+        self.tabela = tabela
+        self.operacao = None
+        self.filtros = []
+        self.dados = None
+        self.conflito = []
+        self.negar = False
+        self.ordem = None
+        self.intervalo = None
+
+    def select(self, colunas="*"):
+        self.operacao = "select"
+        return self
+
+    def insert(self, dados):
+        self.operacao = "insert"
+        self.dados = dados
+        return self
+
+    def upsert(self, dados, on_conflict=""):
+        self.operacao = "upsert"
+        self.dados = dados
+        self.conflito = [coluna.strip() for coluna in on_conflict.split(",") if coluna.strip()]
+        return self
+
+    @property
+    def not_(self):
+        self.negar = True
+        return self
+
+    def adicionar_filtro(self, coluna, operador, valor):
+        self.filtros.append((coluna, operador, valor, self.negar))
+        self.negar = False
+        return self
+
+    def eq(self, coluna, valor):
+        return self.adicionar_filtro(coluna, "in", {valor})
+
+    def in_(self, coluna, valores):
+        return self.adicionar_filtro(coluna, "in", set(valores))
+
+    def gte(self, coluna, valor):
+        return self.adicionar_filtro(coluna, "gte", valor)
+
+    def lte(self, coluna, valor):
+        return self.adicionar_filtro(coluna, "lte", valor)
+
+    def order(self, coluna):
+        self.ordem = coluna
+        return self
+
+    def range(self, inicio, fim):
+        self.intervalo = (inicio, fim)
+        return self
+
+    def execute(self):
+        # Enviar apenas a descrição da consulta ao backend (que pode estar em outro processo)
+        descricao = {chave: valor for chave, valor in vars(self).items() if chave != "backend"}
+        return RespostaLocal(self.backend.executar(descricao))
+
+
+# Autenticação local: aceita qualquer credencial preenchida
+class AuthLocal:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def sign_in_with_password(self, credenciais):
+        return self.backend.autenticar(credenciais)
+
+
+# Cliente no formato do cliente Supabase, ligado ao backend local
+class ClienteLocal:
+    def __init__(self, backend):
+        self.backend = backend
+        self.auth = AuthLocal(backend)
+
+    def table(self, nome):
+        return ConsultaLocal(self.backend, nome)
+
+
+# Substituto local do Supabase: tabelas em memória e contagem de chamadas
+class SupabaseLocal:
+    def __init__(self):
+        self.tabelas = {"microbiologia": []}
+        self.chamadas = Counter()
+        self.lock = threading.Lock()
+
+    def registrar_chamada(self, nome):
+        with self.lock:
+            self.chamadas[nome] += 1
+
+    def obter_chamadas(self):
+        with self.lock:
+            return dict(self.chamadas)
+
+    def carregar_linhas(self, tabela, linhas):
+        with self.lock:
+            self.tabelas.setdefault(tabela, []).extend(linhas)
+
+    def autenticar(self, credenciais):
+        self.registrar_chamada("auth.sign_in_with_password")
+        if not credenciais.get("email") or not credenciais.get("password"):
+            raise ValueError("Credenciais inválidas")
+        return {"user": {"email": credenciais["email"]}}
+
+    def executar(self, descricao):
+        consulta = types.SimpleNamespace(**descricao)
+        self.registrar_chamada(f"{consulta.tabela}.{consulta.operacao}")
+        with self.lock:
+            linhas = self.tabelas.setdefault(consulta.tabela, [])
+            if consulta.operacao == "select":
+                resultado = [
+                    copy.copy(linha) for linha in linhas
+                    if all(atende_filtro(linha, filtro) for filtro in consulta.filtros)
+                ]
+                if consulta.ordem:
+                    resultado.sort(key=lambda linha: linha.get(consulta.ordem) or 0)
+                # Mesmo limite de linhas por resposta da API do Supabase
+                inicio, fim = consulta.intervalo or (0, LIMITE_LINHAS - 1)
+                return resultado[inicio:min(fim + 1, inicio + LIMITE_LINHAS)]
+            if consulta.operacao == "insert":
+                novos = consulta.dados if isinstance(consulta.dados, list) else [consulta.dados]
+                for linha in novos:
+                    linha = dict(linha)
+                    verificar_unicidade(consulta.tabela, linhas, linha)
+                    linha["id"] = len(linhas) + 1
+                    linhas.append(linha)
+                return novos
+            if consulta.operacao == "upsert":
+                novos = consulta.dados if isinstance(consulta.dados, list) else [consulta.dados]
+                for linha in novos:
+                    linha = dict(linha)
+                    chave = tuple(linha.get(coluna) for coluna in consulta.conflito)
+                    existente = next(
+                        (atual for atual in linhas
+                         if consulta.conflito and tuple(atual.get(coluna) for coluna in consulta.conflito) == chave),
+                        None
+                    )
+                    verificar_unicidade(consulta.tabela, linhas, linha, ignorar=existente)
+                    if existente is not None:
+                        existente.update(linha)
+                    else:
+                        linha["id"] = len(linhas) + 1
+                        linhas.append(linha)
+                return novos
+        raise ValueError(f"Operação não suportada: {consulta.operacao}")
+
+
+# Gerenciador que mantém o backend local em um processo compartilhado pelas sessões
+class GerenciadorBackend(BaseManager):
+    pass
+
+
+GerenciadorBackend.register("SupabaseLocal", SupabaseLocal)
+
+
+# Função para gerar um registro aleatório de microbiologia
+def gerar_registro(ponto, data):
+    linha = {
+        "dataamostra": data.isoformat(),
+        "pontoamostra": ponto,
+        "aparenciaamostra": random.choice(registro.obter_opcoes("aparenciaamostra")),
+        "aspectofloco": random.choice(registro.obter_opcoes("aspectofloco")),
+        "filamentos": random.choice(registro.obter_opcoes("filamentos")),
+        "identfilament": random.choice(registro.obter_opcoes("identfilament")),
+    }
+    for coluna in registro.listar_microrganismos():
+        linha[coluna] = random.randint(0, 20)
+    return linha
+
+
+# Função para popular o backend local com dados históricos
+def popular_backend(backend, n_registros):
+    pontos = registro.listar_pontos()
+    hoje = datetime.date.today()
+    linhas = []
+    # Respeitar a chave natural (dataamostra, pontoamostra), como a restrição única do banco
+    chaves = set()
+    while len(linhas) < min(n_registros, len(pontos) * 366):
+        linha = gerar_registro(random.choice(pontos), hoje - datetime.timedelta(days=random.randint(0, 365)))
+        chave = (linha["dataamostra"], linha["pontoamostra"])
+        if chave in chaves:
+            continue
+        chaves.add(chave)
+        linha["id"] = len(linhas) + 1
+        linhas.append(linha)
+    backend.carregar_linhas("microbiologia", linhas)
+
+
+# Função para ler a memória residente (RSS) do processo, em MB
+def ler_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    # Alternativa fora do Linux (pico de memória, em KB no Linux e bytes no macOS)
+    # O módulo resource só existe em sistemas Unix, por isso é importado aqui
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+# Função para localizar um widget pelo rótulo
+def widget(elementos, rotulo):
+    for elemento in elementos:
+        if elemento.label == rotulo:
+            return elemento
+    raise LookupError(f"Widget não encontrado: {rotulo}")
+
+
+# Função para executar o app e medir a duração da execução
+def executar(at):
+    inicio = time.perf_counter()
+    at.run()
+    duracao = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return duracao
+
+
+# Função que descreve a sessão de um operador, passo a passo
+# A cada execução necessária do app, o AppTest é entregue (yield) para quem conduz a carga
+def passos_sessao(indice, n_interacoes, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.secrets["connections"] = {
+        "supabase": {"SUPABASE_URL": "http://localhost", "SUPABASE_KEY": "local"}
+    }
+    yield at
+
+    # Login
+    widget(at.text_input, "Email").input(f"operador{indice}@local")
+    widget(at.text_input, "Senha").input("senha")
+    widget(at.button, "Entrar").click()
+    yield at
+
+    # Envio do formulário
+    planta = random.choice(registro.listar_plantas())
+    widget(at.selectbox, "Estação").set_value(planta)
+    yield at
+    widget(at.selectbox, "Ponto de Amostra").set_value(random.choice(registro.listar_pontos(planta)))
+    widget(at.number_input, "Ciliados Livres").set_value(random.randint(0, 20))
+    widget(at.number_input, "Flagelados").set_value(random.randint(0, 20))
+    widget(at.checkbox, "Substituir registro existente").set_value(random.random() < 0.5)
+    widget(at.button, "Salvar Registro").click()
+    yield at
+
+    # Navegação para a página de Gráficos
+    at.sidebar.radio[0].set_value("Gráficos")
+    yield at
+
+    # Interações com os filtros dos gráficos
+    plantas = ["Todas as Estações"] + registro.listar_plantas()
+    for _ in range(n_interacoes):
+        planta = random.choice(plantas)
+        widget(at.selectbox, "Estação").set_value(planta)
+        yield at
+
+        pontos = widget(at.selectbox, "Filtrar por Ponto de Amostra")
+        pontos.set_value(random.choice(pontos.options))
+        yield at
+
+        microrganismos = widget(at.multiselect, "Selecione os microrganismos para visualizar")
+        microrganismos.set_value(random.sample(microrganismos.options, k=min(2, len(microrganismos.options))))
+        yield at
+
+
+# Função que simula todas as sessões em um único processo, como em um servidor real:
+# um interpretador, um GIL e um único cache do st.cache_data compartilhado entre as sessões.
+# As sessões são intercaladas em rodadas; em cada rodada todas pedem uma execução ao mesmo
+# tempo e são atendidas em fila, de modo que a latência percebida inclui a espera pelas demais
+def simular_servidor(backend, n_sessoes, n_interacoes, timeout):
+    supabase.create_client = lambda url, key: ClienteLocal(backend)
+    sessoes = {indice: passos_sessao(indice, n_interacoes, timeout) for indice in range(n_sessoes)}
+    execucoes = []
+    latencias = []
+    falhas = []
+    while sessoes:
+        fila = 0.0
+        for indice, passos in list(sessoes.items()):
+            try:
+                at = next(passos)
+                duracao = executar(at)
+            except StopIteration:
+                del sessoes[indice]
+                continue
+            except Exception as e:
+                falhas.append(f"sessão {indice}: {type(e).__name__}: {e}")
+                del sessoes[indice]
+                continue
+            fila += duracao
+            execucoes.append(duracao)
+            latencias.append(fila)
+    return execucoes, latencias, falhas
+
+
+# Função executada em um processo dedicado para cada sessão (modo isolado)
+# O AppTest altera estado global do Streamlit (runtime, secrets, páginas), por isso
+# sessões em threads do mesmo processo interferem umas nas outras
+def executar_sessao_isolada(backend, indice, n_interacoes, timeout, semente):
+    supabase.create_client = lambda url, key: ClienteLocal(backend)
+    random.seed(None if semente is None else semente + indice)
+    rss_inicial = ler_rss_mb()
+    latencias = []
+    erro = None
+    try:
+        for at in passos_sessao(indice, n_interacoes, timeout):
+            latencias.append(executar(at))
+    except Exception as e:
+        erro = f"sessão {indice}: {type(e).__name__}: {e}"
+    return {
+        "latencias": latencias,
+        "erro": erro,
+        "rss_inicial": rss_inicial,
+        "rss_final": ler_rss_mb(),
+    }
+
+
+# Função para interromper o relatório quando alguma sessão falhou
+def abortar_se_falhou(falhas, n_sessoes):
+    if not falhas:
+        return
+    # Com sessões falhando, latência e memória medem só uma parte da carga: não reportar
+    print(f"RESULTADO INVÁLIDO: {len(falhas)} de {n_sessoes} sessões falharam; "
+          "latência e memória não são reportadas.")
+    for falha in falhas:
+        print(f"Falha: {falha}")
+    sys.exit(1)
+
+
+# Função para imprimir as chamadas ao backend
+def imprimir_chamadas(chamadas):
+    print("Chamadas ao backend:")
+    for nome, quantidade in sorted(chamadas.items()):
+        print(f"  {nome}: {quantidade}")
+
+
+# Função para calcular um percentil (interpolação linear)
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+# Função principal do teste de carga
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga com sessões simultâneas do app.py")
+    parser.add_argument("--sessoes", type=int, default=10, help="Número de sessões simultâneas")
+    parser.add_argument("--interacoes", type=int, default=3, help="Interações com os filtros por sessão")
+    parser.add_argument("--registros", type=int, default=1000, help="Registros pré-carregados no backend local")
+    parser.add_argument("--timeout", type=float, default=60, help="Tempo máximo por execução do app (s)")
+    parser.add_argument("--semente", type=int, default=None, help="Semente para os dados aleatórios")
+    parser.add_argument(
+        "--modo", choices=["servidor", "isolado"], default="servidor",
+        help="servidor: sessões intercaladas em um processo, com cache compartilhado (como um servidor real); "
+             "isolado: um processo por sessão, com cache próprio"
+    )
+    args = parser.parse_args()
+
+    random.seed(args.semente)
+
+    if args.modo == "servidor":
+        # Backend local no próprio processo
+        backend = SupabaseLocal()
+        popular_backend(backend, args.registros)
+
+        rss_inicial = ler_rss_mb()
+        inicio = time.perf_counter()
+        execucoes, latencias, falhas = simular_servidor(backend, args.sessoes, args.interacoes, args.timeout)
+        duracao = time.perf_counter() - inicio
+        rss_final = ler_rss_mb()
+        abortar_se_falhou(falhas, args.sessoes)
+
+        # Relatório
+        print(f"Sessões simultâneas: {args.sessoes} (um único processo, cache compartilhado)")
+        print(f"Duração total: {duracao:.2f} s")
+        print(f"Execuções do app: {len(execucoes)}")
+        print(f"Tempo de execução p50: {percentil(execucoes, 50) * 1000:.0f} ms | "
+              f"p95: {percentil(execucoes, 95) * 1000:.0f} ms")
+        print(f"Latência percebida (com fila) p50: {percentil(latencias, 50) * 1000:.0f} ms | "
+              f"p95: {percentil(latencias, 95) * 1000:.0f} ms")
+        print(f"RSS do servidor: inicial {rss_inicial:.1f} MB | final {rss_final:.1f} MB")
+        print(f"RSS por sessão: {(rss_final - rss_inicial) / args.sessoes:.2f} MB")
+        imprimir_chamadas(backend.obter_chamadas())
+        return
+
+    # Modo isolado: processos criados do zero (spawn), sem herdar estado do Streamlit
+    contexto = multiprocessing.get_context("spawn")
+
+    with GerenciadorBackend(ctx=contexto) as gerenciador:
+        # Backend local compartilhado por todas as sessões
+        backend = gerenciador.SupabaseLocal()
+        popular_backend(backend, args.registros)
+
+        inicio = time.perf_counter()
+        # Um processo por sessão (maxtasksperchild=1), todas simultâneas
+        with contexto.Pool(processes=args.sessoes, maxtasksperchild=1) as pool:
+            resultados = pool.starmap(
+                executar_sessao_isolada,
+                [(backend, i, args.interacoes, args.timeout, args.semente) for i in range(args.sessoes)]
+            )
+        duracao = time.perf_counter() - inicio
+        chamadas = backend.obter_chamadas()
+
+    abortar_se_falhou([resultado["erro"] for resultado in resultados if resultado["erro"]], args.sessoes)
+
+    latencias = [latencia for resultado in resultados for latencia in resultado["latencias"]]
+    rss_sessao = [resultado["rss_final"] - resultado["rss_inicial"] for resultado in resultados]
+    rss_processo = [resultado["rss_final"] for resultado in resultados]
+
+    # Relatório
+    print(f"Sessões simultâneas: {args.sessoes} (uma por processo)")
+    print("ATENÇÃO: no modo isolado cada sessão tem seu próprio interpretador e seu próprio cache "
+          "(st.cache_data). As chamadas ao backend e a memória abaixo são limites superiores de uma "
+          "sessão isolada, não números de um servidor; a latência não inclui a fila de execuções de "
+          "um servidor único. Para planejamento de capacidade use --modo servidor.")
+    print(f"Duração total: {duracao:.2f} s")
+    print(f"Execuções do app: {len(latencias)}")
+    print(f"Latência p50: {percentil(latencias, 50) * 1000:.0f} ms")
+    print(f"Latência p95: {percentil(latencias, 95) * 1000:.0f} ms")
+    print(f"RSS por sessão (acréscimo durante a sessão, cache próprio incluído): "
+          f"média {sum(rss_sessao) / len(rss_sessao):.1f} MB | máximo {max(rss_sessao):.1f} MB")
+    print(f"RSS por processo de sessão (total): média {sum(rss_processo) / len(rss_processo):.1f} MB")
+    imprimir_chamadas(chamadas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import threading
+import streamlit as st
+import pandas as pd
+import supabase
+import registro
+
+# Função para inicializar conexão com Supabase
+def init_connection():
+    # Obter as credenciais do secrets.toml
+    supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
+    supabase_key = st.secrets["connections"]["supabase"]["SUPABASE_KEY"]
+    
+    # Criar cliente do Supabase
+    client = supabase.create_client(supabase_url, supabase_key)
+    return client
+
+# Linhas por página nas consultas (limite padrão de linhas por resposta da API do Supabase)
+TAMANHO_PAGINA = 1000
+
+# Função para buscar dados da tabela microbiologia (opcionalmente restrita a pontos e datas)
+# A consulta é paginada para não ser truncada pelo limite de linhas por resposta da API
+def fetch_microbiologia_data(client, pontos=None, excluir_pontos=None, data_inicial=None, data_final=None):
+    try:
+        data = []
+        inicio = 0
+        while True:
+            query = client.table('microbiologia').select('*')
+            if pontos is not None:
+                query = query.in_('pontoamostra', pontos)
+            if excluir_pontos:
+                query = query.not_.in_('pontoamostra', excluir_pontos)
+            if data_inicial is not None:
+                query = query.gte('dataamostra', data_inicial.isoformat())
+            if data_final is not None:
+                query = query.lte('dataamostra', data_final.isoformat())
+            response = query.order('id').range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+            if not response.data:
+                break
+            data.extend(response.data)
+            # Avançar pelo número de linhas recebidas (o servidor pode limitar a menos que a página)
+            inicio += len(response.data)
+        return {"success": True, "data": data}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# Função para obter a chave natural de um registro (data da amostra, ponto de amostra)
+def chave_natural(linha):
+    return (str(linha.get('dataamostra'))[:10], linha.get('pontoamostra'))
+
+# Função para remover registros duplicados pela chave natural, mantendo o mais recente,
+# para que os somatórios dos gráficos e relatórios não sejam inflados
+# Retorna os registros únicos e a quantidade de registros descartados
+def remover_duplicatas(registros):
+    unicos = {}
+    for linha in sorted(registros, key=lambda linha: linha.get('id') or 0):
+        unicos[chave_natural(linha)] = linha
+    return list(unicos.values()), len(registros) - len(unicos)
+
+# Função para carregar os dados de uma única estação
+# O cache é particionado por estação: consultar uma estação não carrega as demais
+@st.cache_data(ttl=600, max_entries=50, show_spinner=False)
+def carregar_dados_planta(planta):
+    supabase_client = init_connection()
+    result = fetch_microbiologia_data(supabase_client, registro.listar_pontos(planta))
+    if not result["success"]:
+        # Levantar exceção para que falhas não fiquem armazenadas no cache
+        raise RuntimeError(result["error"])
+    return remover_duplicatas(result["data"])
+
+# Função para obter o índice de chaves naturais de uma estação a partir dos dados em cache
+# Permite detectar registros duplicados sem consultar o servidor; cada chave aponta para
+# o identificador da requisição que gravou o registro
+@st.cache_data(ttl=600, max_entries=50, show_spinner=False)
+def indice_chaves_naturais(planta):
+    registros, _ = carregar_dados_planta(planta)
+    return {chave_natural(linha): linha.get('idrequisicao') for linha in registros}
+
+# Escopos (estações, incluir_nao_cadastrados) já agregados neste servidor, para que a
+# invalidação após uma gravação alcance apenas os agregados que contêm a estação alterada
+_escopos_agregados = set()
+_escopos_lock = threading.Lock()
+
+# Função para agregar os dados por dia, ponto de amostra e microrganismo
+# O cache é indexado pelas estações (não pelo DataFrame) e reaproveitado enquanto
+# o usuário alterna os microrganismos
+def agregar_diario_por_ponto(plantas, incluir_nao_cadastrados=False):
+    plantas = tuple(plantas)
+    with _escopos_lock:
+        _escopos_agregados.add((plantas, incluir_nao_cadastrados))
+    return _agregar_diario_por_ponto(plantas, incluir_nao_cadastrados)
+
+@st.cache_data(ttl=600, max_entries=20, show_spinner=False)
+def _agregar_diario_por_ponto(plantas, incluir_nao_cadastrados):
+    result = carregar_dados_plantas(list(plantas), incluir_nao_cadastrados)
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    
+    # Garantir que a data esteja em formato datetime e normalizada por dia
+    df = pd.DataFrame(result["data"])
+    df['dataamostra'] = pd.to_datetime(df['dataamostra']).dt.normalize()
+    
+    # Somar todas as colunas de microrganismos de uma só vez (data x ponto),
+    # sem a chave primária e demais colunas numéricas que não são contagens
+    numeric_cols = [col for col in registro.listar_microrganismos() if col in df.columns]
+    df_agrupado = df.groupby(['dataamostra', 'pontoamostra'])[numeric_cols].sum().reset_index()
+    
+    # Formato longo: uma linha por data x ponto x microrganismo
+    return df_agrupado.melt(
+        id_vars=['dataamostra', 'pontoamostra'],
+        value_vars=numeric_cols,
+        var_name='microrganismo',
+        value_name='valor'
+    )
+
+# Função para limpar uma única entrada de um cache
+# Em versões do Streamlit cujo .clear() não aceita argumentos, limpa o cache inteiro da função
+def limpar_entrada(funcao_cacheada, *args):
+    try:
+        funcao_cacheada.clear(*args)
+    except TypeError:
+        funcao_cacheada.clear()
+
+# Função para atualizar o índice de chaves naturais de uma estação
+# O índice é derivado dos dados em cache da estação, que também precisam ser recarregados
+def atualizar_indice_planta(planta):
+    limpar_entrada(carregar_dados_planta, planta)
+    limpar_entrada(indice_chaves_naturais, planta)
+
+# Função para invalidar os dados em cache após uma gravação em uma estação
+# Apenas as entradas dessa estação e os agregados que a incluem são descartados;
+# as demais estações continuam em cache
+def limpar_cache_dados(planta):
+    atualizar_indice_planta(planta)
+    with _escopos_lock:
+        escopos = [escopo for escopo in _escopos_agregados if planta in escopo[0]]
+        _escopos_agregados.difference_update(escopos)
+    for plantas, incluir_nao_cadastrados in escopos:
+        limpar_entrada(_agregar_diario_por_ponto, plantas, incluir_nao_cadastrados)
+
+# Função para carregar os registros cujo ponto de amostra não está em registro.json
+# (pontos antigos ou com nome digitado incorretamente), para que não fiquem invisíveis
+@st.cache_data(ttl=600, max_entries=50, show_spinner=False)
+def carregar_dados_nao_cadastrados():
+    supabase_client = init_connection()
+    result = fetch_microbiologia_data(supabase_client, excluir_pontos=registro.listar_pontos())
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return remover_duplicatas(result["data"])
+
+# Função para carregar os dados de um conjunto de estações a partir das partições em cache
+def carregar_dados_plantas(plantas, incluir_nao_cadastrados=False):
+    try:
+        data = []
+        duplicados = 0
+        for planta in plantas:
+            registros, descartados = carregar_dados_planta(planta)
+            data.extend(registros)
+            duplicados += descartados
+        nao_cadastrados = []
+        if incluir_nao_cadastrados:
+            nao_cadastrados, descartados = carregar_dados_nao_cadastrados()
+            data.extend(nao_cadastrados)
+            duplicados += descartados
+        return {"success": True, "data": data, "duplicados": duplicados, "nao_cadastrados": len(nao_cadastrados)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 import datetime
+import json
+import uuid
 import supabase
+import registro
+import dados
 
 # Função para inicializar conexão com Supabase
 def init_connection():
@@ -13,13 +17,30 @@ def init_connection():
     client = supabase.create_client(supabase_url, supabase_key)
     return client
 
-# Função para inserir dados na tabela microbiologia
-def insert_microbiologia_data(client, data):
+# Função para identificar qual restrição de unicidade foi violada em uma gravação
+# Retorna "requisicao" (idrequisicao), "chave_natural" (dataamostra, pontoamostra) ou None
+def identificar_conflito(erro):
+    texto = " ".join(str(parte) for parte in (erro, getattr(erro, 'message', ''), getattr(erro, 'details', '')))
+    if getattr(erro, 'code', None) != '23505' and '23505' not in texto:
+        return None
+    return "requisicao" if 'idrequisicao' in texto else "chave_natural"
+
+# Função para gravar dados na tabela microbiologia
+# Sem substituição é feito um insert simples: a restrição única do servidor rejeita duplicatas
+# em vez de sobrescrevê-las. Com substituição, upsert pela chave natural (dataamostra, pontoamostra).
+def gravar_microbiologia_data(client, data, substituir=False):
     try:
-        response = client.table('microbiologia').insert(data).execute()
+        if substituir:
+            response = client.table('microbiologia').upsert(data, on_conflict='dataamostra,pontoamostra').execute()
+        else:
+            response = client.table('microbiologia').insert(data).execute()
         return {"success": True, "data": response.data}
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        conflito = identificar_conflito(e)
+        if conflito == "requisicao":
+            # A mesma requisição já foi aplicada (ex.: nova tentativa após perda da resposta)
+            return {"success": True, "data": [], "repetida": True}
+        return {"success": False, "error": str(e), "conflito": conflito}
 
 # Função principal para exibir o formulário de inserção
 def show_formulario():
@@ -29,6 +50,9 @@ def show_formulario():
     st.title("Formulário de Registro de Microbiologia")
     st.write("Preencha os campos abaixo para adicionar um novo registro à tabela.")
     
+    # Seleção da estação (fora do formulário para atualizar a lista de pontos)
+    planta = st.selectbox("Estação", options=registro.listar_plantas(), key="formulario_planta")
+    
     # Criar formulário usando st.form para capturar todos os campos de uma vez
     with st.form(key="microbiologia_form"):
         # Campos de data e hora
@@ -39,35 +63,17 @@ def show_formulario():
         # Campos com opções predefinidas (dropdown)
         ponto_amostra = st.selectbox(
             "Ponto de Amostra",
-            options=[
-                "Ipiranga - Reator 1",
-                "Ipiranga - Reator 2",
-                "Ipiranga - Reator 3",
-                "Nissan - Tanque de aeração 1",
-                "Nissan - Tanque de aeração 2"
-            ]
+            options=registro.listar_pontos(planta)
         )
         
         aparencia_amostra = st.selectbox(
             "Aparência da Amostra",
-            options=[
-                "Boa sedimentação",
-                "Boa clarificação",
-                "Amostra turva",
-                "Amostra escura",
-                "Baixa quantidade de sólidos",
-                "Flotação do lodo no frasco"
-            ]
+            options=registro.obter_opcoes("aparenciaamostra")
         )
         
         aspecto_floco = st.selectbox(
             "Aspecto do Floco",
-            options=[
-                "Minúsculo - pinfloc",
-                "Pequeno - mal formado",
-                "Médio",
-                "Grande - com presença de ciliados e filamentos"
-            ]
+            options=registro.obter_opcoes("aspectofloco")
         )
         
         # Campos numéricos para contagens
@@ -92,12 +98,7 @@ def show_formulario():
         # Campo para filamentosa identificada
         filamentos = st.selectbox(
             "Filamentosa identificada",
-            options=[
-                "Microthrix parvicella",
-                "Nocardioformes",
-                "Thiothrix",
-                "não identificada"
-            ]
+            options=registro.obter_opcoes("filamentos")
         )
         
         # Campos para diversidade
@@ -114,14 +115,12 @@ def show_formulario():
         # Campo para quantidade de filamentos
         ident_filament = st.selectbox(
             "Quantidade de Filamentos",
-            options=[
-                "Vários por floco",
-                "Ao menos um por floco",
-                "Raros",
-                "Ausentes"
-            ]
+            options=registro.obter_opcoes("identfilament")
         )
         
+        # Confirmação para substituir um registro já existente para a mesma data e ponto
+        substituir = st.checkbox("Substituir registro existente", help="Marque para sobrescrever o registro já gravado para esta data e ponto de amostra")
+        
         # Botão de envio
         submit_button = st.form_submit_button("Salvar Registro")
     
@@ -150,17 +149,62 @@ def show_formulario():
             "identfilament": ident_filament
         }
         
+        # Identificador da requisição gerado no cliente: só muda quando os valores do formulário
+        # mudam, de modo que reenvios (clique duplo, nova tentativa) reutilizam o mesmo identificador
+        assinatura = json.dumps(data, sort_keys=True, default=str)
+        if st.session_state.get('formulario_assinatura') != assinatura:
+            st.session_state['formulario_assinatura'] = assinatura
+            st.session_state['formulario_request_id'] = str(uuid.uuid4())
+        request_id = st.session_state['formulario_request_id']
+        data["idrequisicao"] = request_id
+        
+        # Requisições já gravadas nesta sessão
+        if 'formulario_requisicoes_gravadas' not in st.session_state:
+            st.session_state['formulario_requisicoes_gravadas'] = set()
+        gravadas = st.session_state['formulario_requisicoes_gravadas']
+        
+        # Verificar duplicidade no índice local (sem consultar o servidor)
+        chave = dados.chave_natural(data)
+        try:
+            indice = dados.indice_chaves_naturais(planta)
+        except Exception as e:
+            indice = None
+            st.warning(f"⚠️ Não foi possível verificar registros duplicados localmente ({e}). "
+                       "A verificação será feita pelo servidor.")
+        
+        if request_id in gravadas or (indice is not None and indice.get(chave) == request_id):
+            st.success("✅ Este registro já havia sido gravado (envio repetido ignorado).")
+            return
+        
+        existente = indice is not None and chave in indice
+        if existente and not substituir:
+            st.warning(f"⚠️ Já existe um registro para {ponto_amostra} em {data_amostra.strftime('%d/%m/%Y')}. "
+                       "Marque \"Substituir registro existente\" para sobrescrevê-lo.")
+            return
+        
         # Exibir spinner durante o envio
         with st.spinner("Enviando dados para o banco de dados..."):
             # Inicializar conexão Supabase
             supabase_client = init_connection()
             
-            # Inserir dados na tabela
-            result = insert_microbiologia_data(supabase_client, data)
+            # Gravar dados na tabela
+            result = gravar_microbiologia_data(supabase_client, data, substituir)
             
             if result["success"]:
-                st.success("✅ Registro adicionado com sucesso!")
+                if result.get("repetida"):
+                    st.success("✅ Este registro já havia sido gravado (envio repetido ignorado).")
+                else:
+                    st.success("✅ Registro atualizado com sucesso!" if substituir and existente else "✅ Registro adicionado com sucesso!")
+                gravadas.add(request_id)
+                # Invalidar os dados em cache da estação para que os gráficos e o índice reflitam o novo registro
+                dados.limpar_cache_dados(planta)
                 #st.balloons()  # Efeito visual de sucesso
+            elif result.get("conflito") == "chave_natural":
+                # Registro gravado por outra sessão ou importação e ainda ausente do índice local
+                st.error(f"❌ Já existe no servidor um registro para {ponto_amostra} em {data_amostra.strftime('%d/%m/%Y')}. "
+                         "Marque \"Substituir registro existente\" para sobrescrevê-lo.")
+                # Atualizar o índice local da estação com o registro que estava faltando
+                dados.atualizar_indice_planta(planta)
             else:
                 st.error(f"❌ Erro ao adicionar registro: {result.get('error')}")
                 st.info("Verifique se todos os campos foram preenchidos corretamente.")
@@ -2,38 +2,110 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import supabase
+import registro
+import dados
 
-# Função para inicializar conexão com Supabase
-def init_connection():
-    # Obter as credenciais do secrets.toml
-    supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
-    supabase_key = st.secrets["connections"]["supabase"]["SUPABASE_KEY"]
+# Função para montar o gráfico de linha (somatório diário das colunas selecionadas)
+# Não depende do Streamlit: também é usada pelo gerador de relatórios
+def criar_grafico_linha(df, selected_cols, ponto_selecionado="Todos os Pontos", start_date=None, end_date=None):
+    # Aplicar filtro se um ponto específico for selecionado
+    if ponto_selecionado != "Todos os Pontos":
+        df_filtrado = df[df['pontoamostra'] == ponto_selecionado]
+    else:
+        df_filtrado = df
     
-    # Criar cliente do Supabase
-    client = supabase.create_client(supabase_url, supabase_key)
-    return client
+    # Agrupar por data e somar os valores das colunas selecionadas
+    if 'dataamostra' in df_filtrado.columns:
+        df_agrupado = df_filtrado.groupby('dataamostra')[selected_cols].sum().reset_index()
+    else:
+        df_agrupado = df_filtrado
+    
+    # Aplicar filtro de data
+    if 'dataamostra' in df_agrupado.columns:
+        if start_date is not None:
+            df_agrupado = df_agrupado[df_agrupado['dataamostra'].dt.date >= start_date]
+        if end_date is not None:
+            df_agrupado = df_agrupado[df_agrupado['dataamostra'].dt.date <= end_date]
+    
+    # Criar gráfico de linha com data no eixo X
+    fig = px.line(df_agrupado, x='dataamostra', y=selected_cols, 
+                 title="Evolução ao longo do tempo" + 
+                 (f" - {ponto_selecionado}" if ponto_selecionado != "Todos os Pontos" else ""))
+    fig.update_xaxes(title="Data da Amostra")
+    fig.update_yaxes(title="Somatório")
+    return fig, df_agrupado
 
-# Função para buscar dados da tabela microbiologia
-def fetch_microbiologia_data(client):
-    try:
-        response = client.table('microbiologia').select('*').execute()
-        return {"success": True, "data": response.data}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+# Função para montar o gráfico de barra (somatório por data e ponto de amostra)
+# Não depende do Streamlit: também é usada pelo gerador de relatórios
+def criar_grafico_barra(df, y_col, ponto_selecionado="Todos os Pontos", start_date=None, end_date=None):
+    # Aplicar filtro se um ponto específico for selecionado
+    if ponto_selecionado != "Todos os Pontos":
+        df_filtrado = df[df['pontoamostra'] == ponto_selecionado]
+    else:
+        df_filtrado = df
+    
+    # Aplicar filtro de data
+    if 'dataamostra' in df_filtrado.columns:
+        if start_date is not None:
+            df_filtrado = df_filtrado[df_filtrado['dataamostra'].dt.date >= start_date]
+        if end_date is not None:
+            df_filtrado = df_filtrado[df_filtrado['dataamostra'].dt.date <= end_date]
+    
+    # Agrupar por data e ponto de amostra e somar os valores numéricos
+    if 'dataamostra' in df_filtrado.columns and 'pontoamostra' in df_filtrado.columns:
+        df_agrupado = df_filtrado.groupby(['dataamostra', 'pontoamostra'])[y_col].sum().reset_index()
+        # Se um ponto específico foi selecionado, usar apenas a data no eixo X
+        if ponto_selecionado != "Todos os Pontos":
+            x_axis = df_agrupado['dataamostra']
+        else:
+            # Combinar data e ponto para o eixo X
+            df_agrupado['data_ponto'] = df_agrupado['dataamostra'].dt.strftime('%d/%m/%Y') + ' - ' + df_agrupado['pontoamostra']
+            x_axis = df_agrupado['data_ponto']
+        fig = px.bar(df_agrupado, x=x_axis, y=y_col, 
+                    title=f"{y_col} por Data" + 
+                    (f" - {ponto_selecionado}" if ponto_selecionado != "Todos os Pontos" else ""))
+    else:
+        df_agrupado = df_filtrado
+        fig = px.bar(df_filtrado, x='dataamostra', y=y_col, 
+                    title=f"{y_col} por Data" + 
+                    (f" - {ponto_selecionado}" if ponto_selecionado != "Todos os Pontos" else ""))
+    
+    # Formatar as datas no eixo X
+    fig.update_xaxes(title="Data da Amostra")
+    fig.update_yaxes(title=y_col)
+    return fig, df_agrupado
 
 # Função principal para exibir a página de gráficos
 def show_graficos():
     st.title("Informações da Microbiologia de Lodos Ativados")
     st.write("Selecione abaixo o tipo de gráfico que deseja visualizar e filtre os dados conforme necessário.")
     
+    # Seleção da estação (apenas os dados da estação escolhida são carregados)
+    plantas = registro.listar_plantas()
+    planta_selecionada = st.selectbox(
+        "Estação",
+        options=["Todas as Estações"] + plantas,
+        key="planta_selecionada"
+    )
+    plantas_escopo = plantas if planta_selecionada == "Todas as Estações" else [planta_selecionada]
+    
+    # Pontos de amostra da(s) estação(ões) selecionada(s), conforme o registro
+    pontos_amostra = [ponto for planta in plantas_escopo for ponto in registro.listar_pontos(planta)]
+    
+    # Registros com pontos fora do registro só são carregados na visão de todas as estações
+    incluir_nao_cadastrados = planta_selecionada == "Todas as Estações"
+    
     # Exibir spinner durante o carregamento dos dados
     with st.spinner("Carregando dados para gráficos..."):
-        # Inicializar conexão Supabase
-        supabase_client = init_connection()
+        # Buscar dados da tabela microbiologia (partições em cache por estação)
+        result = dados.carregar_dados_plantas(plantas_escopo, incluir_nao_cadastrados)
         
-        # Buscar dados da tabela microbiologia
-        result = fetch_microbiologia_data(supabase_client)
+        if result["success"] and result["nao_cadastrados"]:
+            # Exibir os pontos não cadastrados em vez de ocultá-los
+            pontos_nao_cadastrados = sorted({linha['pontoamostra'] for linha in result["data"]} - set(pontos_amostra))
+            pontos_amostra = pontos_amostra + pontos_nao_cadastrados
+            st.warning(f"⚠️ {result['nao_cadastrados']} registro(s) com ponto de amostra não cadastrado em registro.json: "
+                       f"{', '.join(pontos_nao_cadastrados)}. Verifique se o nome do ponto está correto.")
         
         if result["success"]:
             if result["data"]:
@@ -41,7 +113,7 @@ def show_graficos():
                 df = pd.DataFrame(result["data"])
                 
                 # Criar abas para diferentes tipos de gráficos (removido gráfico de dispersão)
-                tab1, tab2 = st.tabs(["Gráficos de Linha", "Gráficos de Barra"])
+                tab1, tab2, tab3 = st.tabs(["Gráficos de Linha", "Gráficos de Barra", "Comparação entre Pontos"])
                 
                 with tab1:
                     st.subheader("Gráficos de Linha")
@@ -62,7 +134,6 @@ def show_graficos():
                         with col1:
                             # Filtro por ponto de amostra
                             if 'pontoamostra' in df.columns:
-                                pontos_amostra = df['pontoamostra'].unique().tolist()
                                 ponto_selecionado = st.selectbox(
                                     "Filtrar por Ponto de Amostra",
                                     options=["Todos os Pontos"] + pontos_amostra
@@ -118,32 +189,17 @@ def show_graficos():
                         )
                         
                         if selected_cols:
-                            # Aplicar filtro se um ponto específico for selecionado
-                            if ponto_selecionado != "Todos os Pontos":
-                                df_filtrado = df[df['pontoamostra'] == ponto_selecionado]
-                            else:
-                                df_filtrado = df
-                            # Agrupar por data e somar os valores das colunas selecionadas
-                            if 'dataamostra' in df_filtrado.columns:
-                                df_agrupado = df_filtrado.groupby('dataamostra')[selected_cols].sum().reset_index()
-                            else:
-                                df_agrupado = df_filtrado
                             # Aplicar filtro de data
-                            if 'dataamostra' in df_agrupado.columns:
+                            if 'dataamostra' in df.columns:
                                 if 'grafico_start_date' not in st.session_state:
                                     st.session_state.grafico_start_date = six_months_ago
                                 if 'grafico_end_date' not in st.session_state:
                                     st.session_state.grafico_end_date = max_date
-                                df_agrupado = df_agrupado[
-                                    (df_agrupado['dataamostra'].dt.date >= st.session_state.grafico_start_date) &
-                                    (df_agrupado['dataamostra'].dt.date <= st.session_state.grafico_end_date)
-                                ]
                             # Criar gráfico de linha com data no eixo X
-                            fig = px.line(df_agrupado, x='dataamostra', y=selected_cols, 
-                                         title="Evolução ao longo do tempo" + 
-                                         (f" - {ponto_selecionado}" if ponto_selecionado != "Todos os Pontos" else ""))
-                            fig.update_xaxes(title="Data da Amostra")
-                            fig.update_yaxes(title="Somatório")
+                            fig, _ = criar_grafico_linha(
+                                df, selected_cols, ponto_selecionado,
+                                st.session_state.get('grafico_start_date'), st.session_state.get('grafico_end_date')
+                            )
                             st.plotly_chart(fig, use_container_width=True)
                         else:
                             st.info("Selecione pelo menos um microrganismo para visualizar o gráfico.")
@@ -163,7 +219,6 @@ def show_graficos():
                         with col1:
                             # Filtro por ponto de amostra
                             if 'pontoamostra' in df.columns:
-                                pontos_amostra = df['pontoamostra'].unique().tolist()
                                 ponto_selecionado = st.selectbox(
                                     "Filtrar por Ponto de Amostra",
                                     options=["Todos os Pontos"] + pontos_amostra,
@@ -212,57 +267,91 @@ def show_graficos():
                                 
                                 st.rerun()
                         
-                        # Aplicar filtro se um ponto específico for selecionado
-                        if ponto_selecionado != "Todos os Pontos":
-                            df_filtrado = df[df['pontoamostra'] == ponto_selecionado]
-                        else:
-                            df_filtrado = df
-                        
-                        # Aplicar filtro de data
-                        if 'dataamostra' in df_filtrado.columns:
+                        if 'dataamostra' in df.columns:
                             # Se não houver data inicial no estado, usar 6 meses atrás
                             if 'grafico_barra_start_date' not in st.session_state:
                                 st.session_state.grafico_barra_start_date = six_months_ago
                             # Se não houver data final no estado, usar a data mais recente
                             if 'grafico_barra_end_date' not in st.session_state:
                                 st.session_state.grafico_barra_end_date = max_date
-                            
-                            # Aplicar filtro de data
-                            df_filtrado = df_filtrado[
-                                (df_filtrado['dataamostra'].dt.date >= st.session_state.grafico_barra_start_date) &
-                                (df_filtrado['dataamostra'].dt.date <= st.session_state.grafico_barra_end_date)
-                            ]
                         
-                        # Agrupar por data e ponto de amostra e somar os valores numéricos
-                        if 'dataamostra' in df_filtrado.columns and 'pontoamostra' in df_filtrado.columns:
-                            y_col = st.selectbox("Selecione a coluna numérica (eixo Y)", 
-                                               num_cols,
-                                               index=num_cols.index('ciliadoslivres') if 'ciliadoslivres' in num_cols else 0)
-                            df_agrupado = df_filtrado.groupby(['dataamostra', 'pontoamostra'])[y_col].sum().reset_index()
-                            # Se um ponto específico foi selecionado, filtrar e usar apenas a data no eixo X
-                            if ponto_selecionado != "Todos os Pontos":
-                                df_agrupado = df_agrupado[df_agrupado['pontoamostra'] == ponto_selecionado]
-                                x_axis = df_agrupado['dataamostra']
-                            else:
-                                # Combinar data e ponto para o eixo X
-                                df_agrupado['data_ponto'] = df_agrupado['dataamostra'].dt.strftime('%d/%m/%Y') + ' - ' + df_agrupado['pontoamostra']
-                                x_axis = df_agrupado['data_ponto']
-                            fig = px.bar(df_agrupado, x=x_axis, y=y_col, 
-                                        title=f"{y_col} por Data" + 
-                                        (f" - {ponto_selecionado}" if ponto_selecionado != "Todos os Pontos" else ""))
-                        else:
-                            fig = px.bar(df_filtrado, x='dataamostra', y=y_col, 
-                                        title=f"{y_col} por Data" + 
-                                        (f" - {ponto_selecionado}" if ponto_selecionado != "Todos os Pontos" else ""))
+                        y_col = st.selectbox("Selecione a coluna numérica (eixo Y)", 
+                                           num_cols,
+                                           index=num_cols.index('ciliadoslivres') if 'ciliadoslivres' in num_cols else 0)
                         
-                        # Formatar as datas no eixo X
-                        fig.update_xaxes(title="Data da Amostra")
-                        fig.update_yaxes(title=y_col)
+                        # Criar gráfico de barra com os filtros de ponto e data aplicados
+                        fig, _ = criar_grafico_barra(
+                            df, y_col, ponto_selecionado,
+                            st.session_state.get('grafico_barra_start_date'), st.session_state.get('grafico_barra_end_date')
+                        )
                         
                         st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.info("São necessárias colunas categóricas e numéricas para criar gráficos de barra.")
                 
+                with tab3:
+                    st.subheader("Comparação entre Pontos")
+                    
+                    if 'dataamostra' in df.columns and 'pontoamostra' in df.columns:
+                        # Agregado único (data x ponto x microrganismo) para todos os pontos
+                        df_longo = dados.agregar_diario_por_ponto(tuple(plantas_escopo), incluir_nao_cadastrados)
+                        microrganismos = df_longo['microrganismo'].unique().tolist()
+                        
+                        if microrganismos:
+                            # Criar colunas para os filtros
+                            col1, col2, col3 = st.columns([2, 1, 1])
+                            
+                            with col1:
+                                # Permitir ao usuário selecionar os microrganismos a comparar
+                                selected_orgs = st.multiselect(
+                                    "Selecione os microrganismos para comparar",
+                                    options=microrganismos,
+                                    default=['ciliadoslivres'] if 'ciliadoslivres' in microrganismos else microrganismos[:1],
+                                    key="grafico_comparacao_microrganismos"
+                                )
+                            
+                            # Obter datas mínima e máxima
+                            max_date = df_longo['dataamostra'].max()
+                            six_months_ago = max_date - pd.DateOffset(months=6)
+                            
+                            with col2:
+                                start_date = st.date_input("Data Inicial", six_months_ago, key="grafico_comparacao_start_date")
+                            
+                            with col3:
+                                end_date = st.date_input("Data Final", max_date, key="grafico_comparacao_end_date")
+                            
+                            if selected_orgs:
+                                # Filtrar o agregado já calculado (sem reagrupar os dados)
+                                df_comparacao = df_longo[
+                                    df_longo['microrganismo'].isin(selected_orgs) &
+                                    (df_longo['dataamostra'].dt.date >= start_date) &
+                                    (df_longo['dataamostra'].dt.date <= end_date)
+                                ]
+                                
+                                # Um subgráfico por ponto de amostra, com eixos compartilhados
+                                n_pontos = df_comparacao['pontoamostra'].nunique()
+                                n_linhas = (n_pontos + 1) // 2
+                                fig = px.line(df_comparacao, x='dataamostra', y='valor',
+                                              color='microrganismo',
+                                              facet_col='pontoamostra',
+                                              facet_col_wrap=2,
+                                              category_orders={'pontoamostra': pontos_amostra},
+                                              # O plotly exige espaçamento <= 1/(linhas-1)
+                                              facet_row_spacing=min(0.08, 1 / (n_linhas - 1)) if n_linhas > 1 else 0.08,
+                                              height=max(350, 300 * n_linhas),
+                                              title="Evolução ao longo do tempo por Ponto de Amostra")
+                                # Mostrar apenas o nome do ponto no título de cada subgráfico
+                                fig.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
+                                fig.update_xaxes(title="Data da Amostra", showticklabels=True)
+                                fig.update_yaxes(title="Somatório")
+                                st.plotly_chart(fig, use_container_width=True)
+                            else:
+                                st.info("Selecione pelo menos um microrganismo para visualizar o gráfico.")
+                        else:
+                            st.info("Não foram encontradas colunas numéricas para criar gráficos.")
+                    else:
+                        st.info("São necessárias as colunas de data e ponto de amostra para comparar os pontos.")
+                
                 # Gráfico de dispersão removido conforme solicitado
             else:
                 st.info("Nenhum dado encontrado na tabela de microbiologia para gerar gráficos.")
@@ -283,6 +372,12 @@ def show_graficos():
     st.subheader("Tabela de Dados")
     st.write("Visualize os dados completos da tabela de microbiologia.")
     
+    if result["success"] and result["duplicados"]:
+        # Informar os registros agrupados pela chave natural (data e ponto de amostra)
+        st.warning(f"⚠️ {result['duplicados']} registro(s) duplicado(s) (mesma data e ponto de amostra) foram ocultados; "
+                   "apenas o registro mais recente de cada data e ponto é exibido e somado. "
+                   "Remova as duplicatas na tabela microbiologia.")
+    
     if result["success"] and result["data"]:
         # Converter para DataFrame para visualização se ainda não foi feito
         df = pd.DataFrame(result["data"])
@@ -293,10 +388,9 @@ def show_graficos():
         with col1:
             # Adicionar filtro por Ponto de Amostra
             if 'pontoamostra' in df.columns:
-                pontos_amostra = ["Todos os Pontos"] + sorted(df['pontoamostra'].unique().tolist())
                 ponto_selecionado = st.selectbox(
                     "Filtrar por Ponto de Amostra",
-                    options=pontos_amostra,
+                    options=["Todos os Pontos"] + pontos_amostra,
                     key="tabela_ponto_amostra"
                 )
         with col2:
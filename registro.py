@@ -0,0 +1,31 @@
+import json
+import os
+import streamlit as st
+
+# Caminho do arquivo de configuração com estações, pontos de amostra e opções
+REGISTRO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "registro.json")
+
+# Função para carregar o registro (lido uma única vez e compartilhado entre sessões)
+@st.cache_resource(show_spinner=False)
+def carregar_registro(caminho=REGISTRO_PATH):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+# Função para listar as estações cadastradas
+def listar_plantas():
+    return list(carregar_registro()["plantas"].keys())
+
+# Função para listar os pontos de amostra de uma estação (ou de todas)
+def listar_pontos(planta=None):
+    plantas = carregar_registro()["plantas"]
+    if planta is not None:
+        return list(plantas.get(planta, []))
+    return [ponto for pontos in plantas.values() for ponto in pontos]
+
+# Função para listar as colunas de contagem de microrganismos (somadas nos gráficos e relatórios)
+def listar_microrganismos():
+    return list(carregar_registro()["microrganismos"])
+
+# Função para obter as opções predefinidas de um campo do formulário
+def obter_opcoes(campo):
+    return list(carregar_registro()["opcoes"].get(campo, []))
@@ -0,0 +1,178 @@
+"""Gerador de relatórios sem interface (linha de comando).
+
+Gera relatórios HTML e/ou CSV para cada combinação de ponto de amostra e
+período, reaproveitando os gráficos de linha e de barra da página de
+Gráficos. Os relatórios são gerados em paralelo por um pool de processos.
+
+Uso:
+    python relatorios.py --periodo mensal --ano 2025
+    python relatorios.py --csv dados.csv --formato csv --destino saida
+"""
+import argparse
+import datetime
+import html
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import supabase
+from dotenv import load_dotenv
+
+import dados
+import graficos
+import registro
+
+# Frequências do pandas para cada tipo de período
+PERIODOS = {"mensal": "M", "trimestral": "Q", "anual": "Y"}
+
+
+# Função para inicializar conexão com Supabase a partir das variáveis de ambiente
+def init_connection():
+    load_dotenv()
+    supabase_url = os.environ["SUPABASE_URL"]
+    supabase_key = os.environ["SUPABASE_KEY"]
+    return supabase.create_client(supabase_url, supabase_key)
+
+
+# Função para carregar os dados (de um CSV ou do Supabase, estação por estação)
+# Com um ano informado, o filtro de datas é aplicado no servidor
+def carregar_dados(plantas, caminho_csv=None, ano=None):
+    data_inicial = datetime.date(ano, 1, 1) if ano else None
+    data_final = datetime.date(ano, 12, 31) if ano else None
+    if caminho_csv:
+        df = pd.read_csv(caminho_csv)
+        df = df[df['pontoamostra'].isin(registro.listar_pontos())]
+        if ano:
+            df = df[pd.to_datetime(df['dataamostra']).dt.year == ano]
+        data = df.to_dict('records')
+    else:
+        client = init_connection()
+        data = []
+        for planta in plantas:
+            result = dados.fetch_microbiologia_data(
+                client, registro.listar_pontos(planta), data_inicial=data_inicial, data_final=data_final
+            )
+            if not result["success"]:
+                raise RuntimeError(f"Erro ao buscar dados da estação {planta}: {result['error']}")
+            data.extend(result["data"])
+    
+    # Descartar duplicatas pela chave natural, como na página de Gráficos
+    data, duplicados = dados.remover_duplicatas(data)
+    if duplicados:
+        print(f"Aviso: {duplicados} registro(s) duplicado(s) (mesma data e ponto de amostra) foram descartados.")
+    df = pd.DataFrame(data)
+    if not df.empty:
+        df['dataamostra'] = pd.to_datetime(df['dataamostra'])
+    return df
+
+
+# Função para gerar um nome de arquivo seguro a partir de um texto
+def nome_arquivo(texto):
+    return re.sub(r'[^0-9A-Za-z]+', '_', texto).strip('_').lower()
+
+
+# Função executada em cada processo: gera os relatórios de um ponto em um período
+def gerar_relatorio(tarefa):
+    df = tarefa["dados"]
+    ponto = tarefa["ponto"]
+    periodo = tarefa["periodo"]
+    colunas = tarefa["colunas"]
+    start_date = periodo.start_time.date()
+    end_date = periodo.end_time.date()
+
+    # Reaproveitar os gráficos da página de Gráficos
+    fig_linha, df_linha = graficos.criar_grafico_linha(df, colunas, ponto, start_date, end_date)
+
+    pasta = os.path.join(tarefa["destino"], nome_arquivo(tarefa["planta"]))
+    os.makedirs(pasta, exist_ok=True)
+    base = os.path.join(pasta, f"{nome_arquivo(ponto)}_{periodo}")
+    arquivos = []
+
+    if "csv" in tarefa["formatos"]:
+        df_csv = df_linha.copy()
+        df_csv.insert(1, 'pontoamostra', ponto)
+        df_csv.to_csv(base + ".csv", index=False)
+        arquivos.append(base + ".csv")
+
+    if "html" in tarefa["formatos"]:
+        titulo = html.escape(f"{ponto} - {periodo}")
+        # O plotly.js é incluído uma única vez, no primeiro gráfico
+        partes = [fig_linha.to_html(full_html=False, include_plotlyjs=tarefa["plotlyjs"])]
+        for coluna in colunas:
+            fig_barra, _ = graficos.criar_grafico_barra(df, coluna, ponto, start_date, end_date)
+            partes.append(fig_barra.to_html(full_html=False, include_plotlyjs=False))
+        partes.append(df_linha.to_html(index=False))
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(
+                "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+                f"<title>{titulo}</title></head><body><h1>{titulo}</h1>"
+                + "".join(partes) +
+                "</body></html>"
+            )
+        arquivos.append(base + ".html")
+
+    return arquivos
+
+
+# Função para montar as tarefas (ponto x período), enviando a cada processo apenas os dados necessários
+def montar_tarefas(df, plantas, args):
+    colunas = args.colunas or [col for col in registro.listar_microrganismos() if col in df.columns]
+
+    tarefas = []
+    for planta in plantas:
+        for ponto in registro.listar_pontos(planta):
+            df_ponto = df[df['pontoamostra'] == ponto]
+            for periodo, df_periodo in df_ponto.groupby(df_ponto['dataamostra'].dt.to_period(PERIODOS[args.periodo])):
+                tarefas.append({
+                    "planta": planta,
+                    "ponto": ponto,
+                    "periodo": periodo,
+                    "dados": df_periodo,
+                    "colunas": colunas,
+                    "formatos": args.formatos,
+                    "plotlyjs": "cdn" if args.cdn else True,
+                    "destino": args.destino,
+                })
+    return tarefas
+
+
+# Função principal do gerador de relatórios
+def main():
+    parser = argparse.ArgumentParser(description="Gera relatórios HTML/CSV por ponto de amostra e período")
+    parser.add_argument("--periodo", choices=list(PERIODOS), default="mensal", help="Agrupamento dos relatórios")
+    parser.add_argument("--ano", type=int, default=None, help="Gerar apenas os períodos deste ano")
+    parser.add_argument("--planta", action="append", default=None, help="Estação a incluir (pode repetir; padrão: todas)")
+    parser.add_argument("--colunas", nargs="+", default=None, help="Microrganismos a incluir (padrão: todos os cadastrados em registro.json)")
+    parser.add_argument("--formato", choices=["html", "csv", "ambos"], default="ambos", help="Formato dos relatórios")
+    parser.add_argument("--destino", default="relatorios", help="Pasta de saída")
+    parser.add_argument("--csv", default=None, help="Ler os dados de um CSV em vez do Supabase")
+    parser.add_argument("--processos", type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    parser.add_argument("--cdn", action="store_true", help="Carregar o plotly.js via CDN em vez de embutir no HTML")
+    args = parser.parse_args()
+    args.formatos = ["html", "csv"] if args.formato == "ambos" else [args.formato]
+
+    plantas = args.planta or registro.listar_plantas()
+    desconhecidas = [planta for planta in plantas if planta not in registro.listar_plantas()]
+    if desconhecidas:
+        parser.error(f"Estação não cadastrada em registro.json: {', '.join(desconhecidas)}")
+
+    inicio = time.perf_counter()
+    df = carregar_dados(plantas, args.csv, args.ano)
+    if df.empty:
+        print("Nenhum dado encontrado para gerar relatórios.")
+        return
+
+    tarefas = montar_tarefas(df, plantas, args)
+    arquivos = []
+    with ProcessPoolExecutor(max_workers=args.processos) as executor:
+        for gerados in executor.map(gerar_relatorio, tarefas, chunksize=4):
+            arquivos.extend(gerados)
+
+    print(f"{len(arquivos)} arquivos gerados em '{args.destino}' "
+          f"({len(tarefas)} combinações de ponto e período) em {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()